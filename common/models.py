@@ -1,34 +1,29 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
 from typing import Any, Dict
 
+import msgspec
 
-@dataclass
-class Task:
-    """Represents a unit of work to be processed by Sentinel workers."""
 
-    id: str  # Unique identifier for this task
+class Task(msgspec.Struct):
+    """Represents a unit of work to be processed by Sentinel workers.
+
+    A msgspec.Struct rather than a dataclass: the schema-specialized
+    codec below is generated C code that serializes instances straight
+    to and from MessagePack with no dict intermediate, and Structs are
+    slotted by design, so the memory profile matches the previous
+    slots=True dataclass.
+    """
+
+    id: bytes  # Raw 16-byte uuid4; use .hex() for human-facing output
     payload: Dict[str, Any]  # Arbitrary data required to execute the task
     priority: int  # Higher value can represent higher priority
     retries: int  # How many times this task has been retried
     status: str  # Current status, e.g. "pending", "running", "completed", "failed"
-    created_at: float  # Creation time as a UNIX timestamp (seconds since epoch)
-
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert this Task instance to a plain dictionary."""
-        return asdict(self)
-
-    @staticmethod
-    def from_dict(data: Dict[str, Any]) -> "Task":
-        """Create a Task instance from a dictionary of fields."""
-        return Task(
-            id=data["id"],
-            payload=data.get("payload", {}),
-            priority=data.get("priority", 0),
-            retries=data.get("retries", 0),
-            status=data.get("status", "pending"),
-            created_at=data["created_at"],
-        )
+    created_at: int  # Creation time in nanoseconds since epoch (time.time_ns)
 
 
+# Shared schema-specialized codec for the enqueue/dequeue hot path.
+# The decoder assigns typed fields directly from the MessagePack bytes.
+encode_task = msgspec.msgpack.Encoder().encode
+decode_task = msgspec.msgpack.Decoder(Task).decode
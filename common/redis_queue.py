@@ -1,7 +1,10 @@
 import os
-import json
+import random
+import threading
+import time
 import redis
-from common.models import Task
+import redis.asyncio as redis_async
+from common.models import Task, decode_task, encode_task
 
 # ============================
 # Redis Configuration
@@ -9,27 +12,170 @@ from common.models import Task
 
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_UNIX_SOCKET = os.getenv("REDIS_UNIX_SOCKET")  # e.g. /var/run/redis/redis.sock
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
+
+# Per-task status lives at sentinel:status:{id} with a TTL, so
+# terminal-state entries expire on their own instead of accumulating
+# forever in one ever-growing hash. Counts never scan these keys;
+# they come from the counters hash below.
+STATUS_PREFIX = b"sentinel:status:"
+STATUS_TTL_SECONDS = int(os.getenv("STATUS_TTL", 3600))
+
+COUNTS_KEY = "sentinel:status_counts"
+
+# Zset members hold only the task id; the msgpack-encoded body lives
+# in this adjacent hash. Skiplist nodes stay small regardless of
+# payload size, so ZADD/ZPOPMIN comparisons never touch body bytes.
+TASKS_KEY = "sentinel:tasks"
+
+# The queue is sharded across several sorted sets so concurrent
+# ZPOPMINs from many workers do not serialize on one hot key. Enqueue
+# picks a uniformly random shard; dequeue peeks two random shards and
+# pops from the one holding the better (lower-score) head — the
+# classic MultiQueue relaxation, trading strict global priority order
+# for near-linear scalability in worker count.
+QUEUE_SHARDS = int(os.getenv("QUEUE_SHARDS", 4))
+SHARD_KEYS = [f"sentinel:q:{i}" for i in range(QUEUE_SHARDS)]
+
+# Retried tasks wait here instead of blocking a worker thread with
+# time.sleep. The score is the unix time the task becomes eligible;
+# each dequeue promotes due entries onto a ready shard first.
+DELAYED_KEY = "sentinel:delayed"
+
+# Queue scores are integers: -priority * PRIORITY_SHIFT plus the
+# creation time in microseconds (created_at is nanoseconds). Higher
+# priority sorts first and FIFO order holds within a priority band to
+# µs granularity, without the float rounding the old
+# `priority * 1_000_000 + created_at` scheme suffered when timestamps
+# carried sub-second fractions.
+PRIORITY_SHIFT = 1 << 42
+
+# A bounded blocking pool keeps a fixed set of sockets alive instead of
+# churning a connection per thread when the API fans out submits. When
+# Redis runs on the same host, point REDIS_UNIX_SOCKET at its socket to
+# skip the TCP stack entirely.
+#
+# Task payloads are stored as MessagePack bytes, so the pool must not
+# decode responses. Status values come back as bytes too and are decoded
+# explicitly where needed.
+if REDIS_UNIX_SOCKET:
+    pool = redis.BlockingConnectionPool(
+        connection_class=redis.UnixDomainSocketConnection,
+        path=REDIS_UNIX_SOCKET,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        decode_responses=False,
+    )
+else:
+    pool = redis.BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_keepalive=True,
+        decode_responses=False,
+    )
 
-QUEUE_KEY = "sentinel:task_queue"
-STATUS_KEY = "sentinel:task_status"
+client = redis.Redis(connection_pool=pool)
+
+# Async client for the FastAPI path, tuned like the sync pool above.
+# Keeping enqueues on the event loop avoids a thread-hop per request,
+# and concurrent awaits share the pooled sockets.
+if REDIS_UNIX_SOCKET:
+    async_pool = redis_async.BlockingConnectionPool(
+        connection_class=redis_async.UnixDomainSocketConnection,
+        path=REDIS_UNIX_SOCKET,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        decode_responses=False,
+    )
+else:
+    async_pool = redis_async.BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_keepalive=True,
+        decode_responses=False,
+    )
 
-client = redis.Redis(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    decode_responses=True
-)
+async_client = redis_async.Redis(connection_pool=async_pool)
 
 # ============================
 # Internal Helpers
 # ============================
 
-def _priority_score(priority: int, created_at: float) -> float:
-    """
-    Calculate score for Redis Sorted Set.
-    Higher priority tasks should execute first.
-    FIFO order preserved for same priority.
-    """
-    return -(priority * 1_000_000) + created_at
+def _status_key(task_id: bytes) -> bytes:
+    """Key holding the TTL'd status string for one task."""
+    return STATUS_PREFIX + task_id
+
+
+def _random_shard() -> str:
+    """Pick a uniformly random queue shard for insertion."""
+    return SHARD_KEYS[random.randrange(QUEUE_SHARDS)]
+
+
+def _candidate_shards() -> tuple[str, str]:
+    """Pick two distinct random shards for the try-2-choose-min pop."""
+    if QUEUE_SHARDS == 1:
+        return SHARD_KEYS[0], SHARD_KEYS[0]
+    a, b = random.sample(SHARD_KEYS, 2)
+    return a, b
+
+
+# Server-side script that first promotes due entries from the delayed
+# zset (KEYS[5]) onto the first candidate shard, then peeks the two
+# candidate shards (KEYS[1] and KEYS[2]), pops up to ARGV[1] task ids
+# from the one with the better head, flips their status to
+# IN_PROGRESS, and collects (and deletes) their bodies from the task
+# hash — all in one atomic step. This saves round-trips and closes the
+# window where a task is popped but still looks pending. Status keys
+# are built from the ARGV[2] prefix and expire after ARGV[3] seconds;
+# ARGV[4] is the current unix time and ARGV[5] the priority shift used
+# to rebuild a promoted task's queue score from its body.
+_DEQUEUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[5], 0, ARGV[4], 'LIMIT', 0, ARGV[1])
+for i = 1, #due do
+    local id = due[i]
+    local body = redis.call('HGET', KEYS[3], id)
+    if body then
+        local t = cmsgpack.unpack(body)
+        local score = -t.priority * tonumber(ARGV[5]) + t.created_at / 1000
+        redis.call('ZADD', KEYS[1], score, id)
+        redis.call('ZREM', KEYS[5], id)
+    else
+        -- A delayed member without a body is an invariant violation;
+        -- drop the entry but repair the counter it holds instead of
+        -- silently destroying a queued task.
+        redis.call('ZREM', KEYS[5], id)
+        redis.call('HINCRBY', KEYS[4], 'QUEUED', -1)
+    end
+end
+local src = KEYS[1]
+local a = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local b = redis.call('ZRANGE', KEYS[2], 0, 0, 'WITHSCORES')
+if #a == 0 and #b == 0 then
+    return {}
+end
+if #a == 0 or (#b > 0 and tonumber(b[2]) < tonumber(a[2])) then
+    src = KEYS[2]
+end
+local popped = redis.call('ZPOPMIN', src, ARGV[1])
+local bodies = {}
+for i = 1, #popped, 2 do
+    local id = popped[i]
+    redis.call('SET', ARGV[2] .. id, 'IN_PROGRESS', 'EX', ARGV[3])
+    local body = redis.call('HGET', KEYS[3], id)
+    if body then
+        redis.call('HDEL', KEYS[3], id)
+        bodies[#bodies + 1] = body
+    end
+end
+if #bodies > 0 then
+    redis.call('HINCRBY', KEYS[4], 'QUEUED', -#bodies)
+    redis.call('HINCRBY', KEYS[4], 'IN_PROGRESS', #bodies)
+end
+return bodies
+"""
+
+_dequeue_script = client.register_script(_DEQUEUE_LUA)
 
 
 # ============================
@@ -39,62 +185,226 @@ def _priority_score(priority: int, created_at: float) -> float:
 def enqueue_task(task: Task) -> None:
     """
     Push task into Redis priority queue.
+
+    The zadd + hset pair is pipelined so each enqueue costs a single
+    network round-trip instead of two.
+    """
+    score = -task.priority * PRIORITY_SHIFT + task.created_at // 1_000
+
+    # Body and status go in before the ZADD: commands in a
+    # non-transactional pipeline apply one at a time, and a blocked
+    # BZPOPMIN fires the instant the member appears, so the id must
+    # never be visible before its body exists.
+    pipe = client.pipeline(transaction=False)
+    pipe.hset(TASKS_KEY, task.id, encode_task(task))
+    pipe.set(_status_key(task.id), task.status, ex=STATUS_TTL_SECONDS)
+    pipe.zadd(_random_shard(), {task.id: score})
+    pipe.hincrby(COUNTS_KEY, "QUEUED", 1)
+    pipe.hincrby(COUNTS_KEY, "SUBMITTED", 1)
+    pipe.execute()
+
+
+async def enqueue_task_async(task: Task) -> None:
     """
-    score = _priority_score(task.priority, task.created_at)
+    Async variant of enqueue_task for the FastAPI path.
 
-    client.zadd(
-        QUEUE_KEY,
-        {json.dumps(task.to_dict()): score}
-    )
+    Runs on the event loop through redis.asyncio instead of hopping to
+    a worker thread; the same single pipelined round-trip applies.
+    """
+    score = -task.priority * PRIORITY_SHIFT + task.created_at // 1_000
+
+    # Body and status before the ZADD, same as enqueue_task: the id
+    # must never be visible in a shard before its body exists.
+    pipe = async_client.pipeline(transaction=False)
+    pipe.hset(TASKS_KEY, task.id, encode_task(task))
+    pipe.set(_status_key(task.id), task.status, ex=STATUS_TTL_SECONDS)
+    pipe.zadd(_random_shard(), {task.id: score})
+    pipe.hincrby(COUNTS_KEY, "QUEUED", 1)
+    pipe.hincrby(COUNTS_KEY, "SUBMITTED", 1)
+    await pipe.execute()
 
-    client.hset(STATUS_KEY, task.id, task.status)
+
+def schedule_retries(tasks: list[Task]) -> None:
+    """
+    Park retryable tasks in the delayed zset in one round-trip.
+
+    Each score is the unix time the task becomes eligible again —
+    exponential backoff of 2^retries seconds — and the dequeue script
+    promotes due entries back onto a ready shard. Workers never sleep
+    through a backoff window; they keep serving other tasks.
+    """
+    if not tasks:
+        return
+
+    now = time.time()
+    members = {task.id: now + 2**task.retries for task in tasks}
+    bodies = {task.id: encode_task(task) for task in tasks}
+
+    # Bodies and statuses before the ZADD so a delayed member is never
+    # visible to the promote loop without its body.
+    pipe = client.pipeline(transaction=False)
+    pipe.hset(TASKS_KEY, mapping=bodies)
+    for task in tasks:
+        pipe.set(_status_key(task.id), task.status, ex=STATUS_TTL_SECONDS)
+    pipe.zadd(DELAYED_KEY, members)
+    # Delayed tasks count as queued again rather than in progress.
+    pipe.hincrby(COUNTS_KEY, "QUEUED", len(tasks))
+    pipe.hincrby(COUNTS_KEY, "IN_PROGRESS", -len(tasks))
+    pipe.execute()
 
 
 def dequeue_task() -> Task | None:
     """
-    Pop highest-priority task from queue.
+    Pop highest-priority task from queue and mark it IN_PROGRESS.
+
+    Runs as a single atomic Lua script, so the pop and the status
+    update cost one round-trip between them.
     """
-    result = client.zpopmin(QUEUE_KEY, count=1)
+    tasks = dequeue_batch(1)
+    return tasks[0] if tasks else None
+
+
+def dequeue_batch(count: int) -> list[Task]:
+    """
+    Pop up to `count` highest-priority tasks and mark them IN_PROGRESS.
+
+    One round-trip drains the whole batch, amortizing network latency
+    across `count` tasks for high-throughput workers. Two random
+    shards are offered to the script, which pops from the one holding
+    the better head; an empty result does not mean every shard is
+    empty, only that this pair was.
+    """
+    shard_a, shard_b = _candidate_shards()
+    result = _dequeue_script(
+        keys=[shard_a, shard_b, TASKS_KEY, COUNTS_KEY, DELAYED_KEY],
+        args=[count, STATUS_PREFIX, STATUS_TTL_SECONDS, time.time(), PRIORITY_SHIFT],
+    )
 
-    if not result:
+    return [decode_task(task_bytes) for task_bytes in result]
+
+
+def dequeue_task_blocking(timeout: int = 5) -> Task | None:
+    """
+    Block until a task arrives on any shard, up to `timeout` seconds.
+
+    Used by idle workers instead of client-side polling: BZPOPMIN
+    parks the connection server-side (zero round-trips while waiting)
+    and wakes the moment a member lands on one of the shards. The
+    blocking command cannot run inside the Lua script, so the
+    IN_PROGRESS transition goes through the write-behind buffer.
+    """
+    result = client.bzpopmin(SHARD_KEYS, timeout=timeout)
+
+    if result is None:
         return None
 
-    task_json, _ = result[0]
-    return Task.from_dict(json.loads(task_json))
+    _shard, task_id, _score = result
+
+    # The member is just the task id; fetch-and-delete its body from
+    # the adjacent hash in one pipelined round-trip.
+    pipe = client.pipeline(transaction=False)
+    pipe.hget(TASKS_KEY, task_id)
+    pipe.hdel(TASKS_KEY, task_id)
+    body, _ = pipe.execute()
+
+    if body is None:
+        # The member was already popped, so this is an invariant
+        # violation (a zset id without a body), not an idle timeout.
+        # Log it and repair the counter the enqueue incremented.
+        print(
+            f"[queue] Popped task {task_id.hex()} has no body in "
+            f"{TASKS_KEY}; dropping it and repairing the QUEUED counter."
+        )
+        client.hincrby(COUNTS_KEY, "QUEUED", -1)
+        return None
+
+    task = decode_task(body)
+    mark_task_in_progress(task.id)
+    return task
 
 
 def get_queue_size() -> int:
     """
-    Number of tasks waiting in queue.
+    Number of tasks waiting in queue, summed over all shards.
     """
-    return client.zcard(QUEUE_KEY)
+    pipe = client.pipeline(transaction=False)
+    for shard in SHARD_KEYS:
+        pipe.zcard(shard)
+    return sum(pipe.execute())
 
 
 # ============================
 # Task Status Helpers
 # ============================
 
-def mark_task_in_progress(task_id: str) -> None:
-    client.hset(STATUS_KEY, task_id, "IN_PROGRESS")
+# Write-behind buffer for status updates. The mark_* helpers record the
+# new status here instead of paying one Redis round-trip each; callers
+# (the worker, once per batch) invoke flush_status() to push all
+# buffered updates as a single multi-field HSET.
+_status_buf: dict[bytes, str] = {}
+_count_buf: dict[str, int] = {}
+_status_lock = threading.Lock()
+
 
+def _buffer_status(task_id: bytes, status: str, old_status: str) -> None:
+    with _status_lock:
+        _status_buf[task_id] = status
+        _count_buf[old_status] = _count_buf.get(old_status, 0) - 1
+        _count_buf[status] = _count_buf.get(status, 0) + 1
 
-def mark_task_completed(task_id: str) -> None:
-    client.hset(STATUS_KEY, task_id, "COMPLETED")
 
+def flush_status() -> None:
+    """
+    Flush all buffered status updates to Redis in one round-trip:
+    one pipelined batch of TTL'd SETs plus the matching counter deltas.
+    """
+    with _status_lock:
+        if not _status_buf:
+            return
+        pending = dict(_status_buf)
+        deltas = dict(_count_buf)
+        _status_buf.clear()
+        _count_buf.clear()
 
-def mark_task_failed(task_id: str) -> None:
-    client.hset(STATUS_KEY, task_id, "FAILED")
+    pipe = client.pipeline(transaction=False)
+    for task_id, status in pending.items():
+        pipe.set(_status_key(task_id), status, ex=STATUS_TTL_SECONDS)
+    for status, delta in deltas.items():
+        if delta:
+            pipe.hincrby(COUNTS_KEY, status, delta)
+    pipe.execute()
 
 
-def get_task_status(task_id: str) -> str | None:
-    return client.hget(STATUS_KEY, task_id)
+def mark_task_in_progress(task_id: bytes) -> None:
+    _buffer_status(task_id, "IN_PROGRESS", "QUEUED")
+
+
+def mark_task_completed(task_id: bytes) -> None:
+    _buffer_status(task_id, "COMPLETED", "IN_PROGRESS")
+
+
+def mark_task_failed(task_id: bytes) -> None:
+    _buffer_status(task_id, "FAILED", "IN_PROGRESS")
+
+
+def get_task_status(task_id: bytes) -> str | None:
+    # Check the local buffer first so unflushed updates are visible.
+    with _status_lock:
+        if task_id in _status_buf:
+            return _status_buf[task_id]
+
+    status = client.get(_status_key(task_id))
+    return status.decode() if status is not None else None
 
 
 def get_all_status_counts() -> dict:
     """
     Count tasks by status.
+
+    Reads the HINCRBY-maintained counters hash — an O(1) lookup of four
+    fields instead of an O(N) HVALS scan over every task ever seen.
     """
-    statuses = client.hvals(STATUS_KEY)
+    raw = client.hgetall(COUNTS_KEY)
 
     counts = {
         "QUEUED": 0,
@@ -103,9 +413,8 @@ def get_all_status_counts() -> dict:
         "FAILED": 0
     }
 
-    for status in statuses:
-        if status in counts:
-            counts[status] += 1
+    for status, count in raw.items():
+        counts[status.decode()] = int(count)
 
     return counts
 
@@ -118,9 +427,18 @@ def get_stats() -> dict:
     """
     Return system-wide statistics.
     Used by /stats endpoint.
+
+    One O(1) HGETALL of the counters hash — nothing scans per-task
+    state, and the keys match what the endpoint actually reads (the
+    old dict shipped different keys than main.py consumed).
     """
+    raw = client.hgetall(COUNTS_KEY)
+    counts = {field.decode(): int(value) for field, value in raw.items()}
+
     return {
-        "queue_size": get_queue_size(),
-        "status_counts": get_all_status_counts()
+        "total_submitted": counts.get("SUBMITTED", 0),
+        "completed": counts.get("COMPLETED", 0),
+        "failed": counts.get("FAILED", 0),
+        "in_queue": counts.get("QUEUED", 0),
     }
 
@@ -0,0 +1,145 @@
+import os
+import socket
+
+import redis
+
+from common.models import Task, decode_task, encode_task
+from common.redis_queue import (
+    COUNTS_KEY,
+    STATUS_TTL_SECONDS,
+    _status_key,
+    client,
+)
+
+# ============================
+# Stream Configuration
+# ============================
+#
+# Alternative queue backend built on Redis Streams instead of the
+# sorted set in redis_queue. XADD gives O(1) insertion, XREADGROUP
+# with BLOCK gives long-poll dequeue with no idle spinning, the
+# consumer group's pending list tracks in-flight entries, and XACK
+# marks completion — all without ZPOPMIN contention on one hot key.
+#
+# Priority is coarser than the zset backend: tasks are routed into a
+# high/mid/low stream and workers always drain higher bands first.
+#
+# Select it by setting QUEUE_BACKEND=stream on both API and worker.
+# Status tracking (hash + counters) is shared with redis_queue.
+
+STREAM_KEYS = [
+    "sentinel:stream:high",
+    "sentinel:stream:mid",
+    "sentinel:stream:low",
+]
+GROUP_NAME = "workers"
+CONSUMER_NAME = os.getenv("WORKER_NAME", socket.gethostname())
+BLOCK_MS = 5000  # How long XREADGROUP blocks server-side when idle
+
+_group_ready = False
+
+
+# ============================
+# Internal Helpers
+# ============================
+
+def _stream_for(priority: int) -> str:
+    """Map a numeric priority onto one of the coarse priority bands."""
+    if priority >= 10:
+        return STREAM_KEYS[0]
+    if priority >= 1:
+        return STREAM_KEYS[1]
+    return STREAM_KEYS[2]
+
+
+def _ensure_group() -> None:
+    """Create the consumer group on each stream once per process."""
+    global _group_ready
+    if _group_ready:
+        return
+
+    for key in STREAM_KEYS:
+        try:
+            client.xgroup_create(key, GROUP_NAME, id="0", mkstream=True)
+        except redis.ResponseError:
+            # BUSYGROUP: the group already exists, which is fine.
+            pass
+
+    _group_ready = True
+
+
+# ============================
+# Queue Operations
+# ============================
+
+def enqueue_task(task: Task) -> None:
+    """
+    Append a task to its priority stream in one pipelined round-trip.
+    """
+    pipe = client.pipeline(transaction=False)
+    pipe.xadd(
+        _stream_for(task.priority),
+        {"data": encode_task(task)}
+    )
+    pipe.set(_status_key(task.id), task.status, ex=STATUS_TTL_SECONDS)
+    pipe.hincrby(COUNTS_KEY, "QUEUED", 1)
+    if task.status == "REQUEUED":
+        # The task was IN_PROGRESS before being re-appended for retry.
+        pipe.hincrby(COUNTS_KEY, "IN_PROGRESS", -1)
+    else:
+        pipe.hincrby(COUNTS_KEY, "SUBMITTED", 1)
+    pipe.execute()
+
+
+def dequeue_batch(count: int) -> list[tuple[bytes, bytes, Task]]:
+    """
+    Read up to `count` entries, blocking up to BLOCK_MS when idle.
+
+    Higher-priority streams are listed first, so XREADGROUP serves
+    their entries before lower bands. Returns (stream_key, entry_id,
+    Task) tuples; callers must ack_task() each entry once processing
+    finishes so it leaves the group's pending list.
+    """
+    _ensure_group()
+
+    response = client.xreadgroup(
+        GROUP_NAME,
+        CONSUMER_NAME,
+        {key: ">" for key in STREAM_KEYS},
+        count=count,
+        block=BLOCK_MS,
+    )
+
+    entries = []
+    for stream_key, items in response or []:
+        for entry_id, fields in items:
+            task = decode_task(fields[b"data"])
+            entries.append((stream_key, entry_id, task))
+
+    return entries
+
+
+def ack_task(stream_key: bytes, entry_id: bytes) -> None:
+    """
+    Acknowledge and delete a processed entry in one round-trip.
+    """
+    ack_tasks([(stream_key, entry_id)])
+
+
+def ack_tasks(entries: list[tuple[bytes, bytes]]) -> None:
+    """
+    Acknowledge and delete a batch of processed entries in one
+    round-trip, grouping ids so each stream needs one XACK + XDEL.
+    """
+    if not entries:
+        return
+
+    ids_by_stream: dict[bytes, list[bytes]] = {}
+    for stream_key, entry_id in entries:
+        ids_by_stream.setdefault(stream_key, []).append(entry_id)
+
+    pipe = client.pipeline(transaction=False)
+    for stream_key, ids in ids_by_stream.items():
+        pipe.xack(stream_key, GROUP_NAME, *ids)
+        pipe.xdel(stream_key, *ids)
+    pipe.execute()
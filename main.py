@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import os
 import time
 import uuid
 from typing import Any, Dict, Optional
@@ -8,12 +9,15 @@ from typing import Any, Dict, Optional
 from fastapi import FastAPI
 from pydantic import BaseModel
 
+from common import stream_queue
 from common.models import Task
-from common.redis_queue import enqueue_task, get_stats
+from common.redis_queue import enqueue_task_async, get_stats
 
 
 app = FastAPI(title="Sentinel Task API")
 
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "zset")  # "zset" (default) or "stream"
+
 
 class SubmitTaskRequest(BaseModel):
     """Schema for incoming task submissions.
@@ -56,23 +60,29 @@ async def submit_task(request: SubmitTaskRequest) -> SubmitTaskResponse:
     payload = request.payload
     priority = request.priority if request.priority is not None else 0
 
-    # Step 2: Create a new Task instance.
+    # Step 2: Create a new Task instance. The raw uuid bytes and the
+    # integer nanosecond timestamp skip the string/float formatting
+    # that `str(uuid4())` + `time.time()` paid on every submit.
     task = Task(
-        id=str(uuid.uuid4()),
+        id=uuid.uuid4().bytes,
         payload=payload,
         priority=priority,
         retries=0,
         status="pending",
-        created_at=time.time(),
+        created_at=time.time_ns(),
     )
 
     # Step 3: Enqueue the task into Redis.
-    # `enqueue_task` is synchronous, so we offload it to a thread to avoid
-    # blocking the asyncio event loop.
-    await asyncio.to_thread(enqueue_task, task)
-
-    # Step 4: Return task information to the client.
-    return SubmitTaskResponse(task_id=task.id, status=task.status)
+    # The async Redis client keeps us on the event loop, so there is no
+    # thread-hop per request. The stream backend is sync-only for now,
+    # so it goes through a worker thread.
+    if QUEUE_BACKEND == "stream":
+        await asyncio.to_thread(stream_queue.enqueue_task, task)
+    else:
+        await enqueue_task_async(task)
+
+    # Step 4: Return task information to the client (hex id for humans).
+    return SubmitTaskResponse(task_id=task.id.hex(), status=task.status)
 
 
 @app.get("/stats", response_model=StatsResponse)
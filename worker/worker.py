@@ -1,23 +1,29 @@
 from __future__ import annotations
 
+import os
 import random
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from common import stream_queue
 from common.models import Task
 from common.redis_queue import (
-    dequeue_task,
-    enqueue_task,
-    get_queue_size,
+    dequeue_batch,
+    dequeue_task_blocking,
+    flush_status,
     mark_task_completed,
     mark_task_failed,
+    mark_task_in_progress,
+    schedule_retries,
 )
 
 
 FAILURE_PROBABILITY = 0.2  # 20% of tasks will "fail" to simulate real-world errors
 SLEEP_SECONDS = 1.0  # Simulated execution time per task
-IDLE_SLEEP_SECONDS = 0.5  # Sleep when there is no work to avoid busy-waiting
 MAX_RETRIES = 3  # Maximum number of attempts per task (initial try + 2 more)
+BATCH_SIZE = int(os.getenv("WORKER_BATCH", "16"))  # Tasks pulled per Redis round-trip
+MAX_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "16"))  # Tasks executed in parallel
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "zset")  # "zset" (default) or "stream"
 
 
 def execute_task(task: Task) -> bool:
@@ -25,96 +31,192 @@ def execute_task(task: Task) -> bool:
 
     Returns True if the task "succeeds", False if it "fails".
     """
-    print(f"[worker] Starting task {task.id} with priority={task.priority}")
+    print(f"[worker] Starting task {task.id.hex()} with priority={task.priority}")
 
     # Simulate actual work taking some time.
     time.sleep(SLEEP_SECONDS)
 
     # Randomly decide whether the task succeeds or fails.
     if random.random() < FAILURE_PROBABILITY:
-        print(f"[worker] Task {task.id} failed during execution.")
+        print(f"[worker] Task {task.id.hex()} failed during execution.")
         return False
 
-    print(f"[worker] Task {task.id} completed successfully.")
+    print(f"[worker] Task {task.id.hex()} completed successfully.")
     return True
 
 
+def handle_task(task: Task) -> Task | None:
+    """Execute one task and apply its status/retry bookkeeping.
+
+    Returns the task when it still has retries left and should be
+    requeued, or None when it reached a terminal state. Runs inside
+    the worker's thread pool; the status helpers buffer their updates
+    behind a lock, so concurrent calls are safe.
+    """
+    # Simulate execution of the task.
+    success = execute_task(task)
+
+    if success:
+        # On success we simply mark the task as completed.
+        task.status = "COMPLETED"
+        mark_task_completed(task.id)
+        print(f"[worker] Task {task.id.hex()} finished with status={task.status}")
+        return None
+
+    # On failure, we increment the retries count and decide whether
+    # to give the task another chance or fail it permanently.
+    task.retries += 1
+
+    if task.retries > MAX_RETRIES:
+        # The task has exceeded the maximum allowed attempts.
+        # We mark it as permanently failed and do NOT requeue it.
+        task.status = "FAILED"
+        mark_task_failed(task.id)
+        print(
+            f"[worker] Task {task.id.hex()} reached max retries "
+            f"({MAX_RETRIES}) and is marked as permanently FAILED."
+        )
+        return None
+
+    # The task still has retries left.
+    # Exponential backoff (2^retries seconds) is applied through the
+    # delayed zset: the task only becomes eligible again once the
+    # backoff elapses, and no worker thread sleeps through it.
+    delay = 2**task.retries
+    print(
+        f"[worker] Task {task.id.hex()} will be retried "
+        f"(attempt {task.retries}/{MAX_RETRIES}) after {delay}s."
+    )
+
+    task.status = "REQUEUED"
+    return task
+
+
 def worker_loop() -> None:
     """Main worker loop.
 
     Worker lifecycle:
     1. Connect to the Redis-backed queue through helper functions.
-    2. Continuously try to pull the next available task.
-    3. If a task is found, simulate execution and decide success/failure.
-    4. On failure, apply retry logic with exponential backoff and requeueing.
-    5. Update the in-memory task status and log the outcome.
-    6. If no task is available, sleep briefly before checking again.
+    2. Continuously pull a batch of available tasks in one round-trip,
+       parking on a blocking pop when the queue is empty.
+    3. Fan the batch out to a thread pool so tasks execute in
+       parallel instead of one at a time.
+    4. On failure, apply retry logic with exponential backoff; all
+       retryable tasks are requeued together at the end of the batch.
+    5. Update the task status and log the outcome.
 
     This simple loop can later be extended with graceful shutdown,
     metrics, and real persistence of task status.
     """
     print("[worker] Starting worker loop. Press Ctrl+C to stop.")
     try:
-        while True:
-            queue_size = get_queue_size()
-            if queue_size == 0:
-                # No tasks available; worker idles briefly before polling again.
-                time.sleep(IDLE_SLEEP_SECONDS)
-                continue
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+            while True:
+                tasks = dequeue_batch(BATCH_SIZE)
+                if not tasks:
+                    # The sampled shard pair was empty. Instead of polling,
+                    # park on BZPOPMIN until a task lands on any shard (or
+                    # the server-side timeout elapses).
+                    task = dequeue_task_blocking()
+                    if task is None:
+                        continue
+                    tasks = [task]
+
+                # Run the whole batch concurrently; tasks that still
+                # have retries left come back from handle_task and are
+                # requeued in a single pipelined batch below.
+                futures = [pool.submit(handle_task, task) for task in tasks]
+                retry_tasks = [
+                    future.result()
+                    for future in as_completed(futures)
+                    if future.result() is not None
+                ]
+
+                # Push all buffered status updates from this batch in
+                # one round-trip BEFORE requeueing: schedule_retries
+                # writes REQUEUED status keys, which a later flush of
+                # the buffered IN_PROGRESS marks would overwrite.
+                flush_status()
+
+                if retry_tasks:
+                    # Park every retryable task from this batch in the
+                    # delayed zset in one round-trip; each becomes
+                    # eligible again once its backoff elapses.
+                    schedule_retries(retry_tasks)
+                    for task in retry_tasks:
+                        print(f"[worker] Task {task.id.hex()} has been scheduled for retry.")
+
+    except KeyboardInterrupt:
+        # Allow clean exit when running the worker from the command line.
+        print("[worker] Received shutdown signal. Exiting worker loop.")
+
+
+def stream_worker_loop() -> None:
+    """Worker loop for the Redis Streams backend (QUEUE_BACKEND=stream).
 
-            task: Optional[Task] = dequeue_task()
-            if task is None:
-                # Another worker may have claimed the task between size check and dequeue.
-                time.sleep(IDLE_SLEEP_SECONDS)
+    XREADGROUP blocks server-side while the streams are empty, so there
+    is no idle polling. Each processed entry is XACK'd out of the
+    consumer group's pending list; retryable failures are re-appended
+    to their priority stream before the original entry is acknowledged.
+    """
+    print("[worker] Starting stream worker loop. Press Ctrl+C to stop.")
+    try:
+        while True:
+            entries = stream_queue.dequeue_batch(BATCH_SIZE)
+            if not entries:
+                # The blocking read timed out without new entries.
                 continue
 
-            # Simulate execution of the task.
-            success = execute_task(task)
-
-            if success:
-                # On success we simply mark the task as completed.
-                task.status = "COMPLETED"
-                mark_task_completed()
-                print(f"[worker] Task {task.id} finished with status={task.status}")
-            else:
-                # On failure, we increment the retries count and decide whether
-                # to give the task another chance or fail it permanently.
-                task.retries += 1
-
-                if task.retries > MAX_RETRIES:
-                    # The task has exceeded the maximum allowed attempts.
-                    # We mark it as permanently failed and do NOT requeue it.
-                    task.status = "FAILED"
-                    mark_task_failed()
-                    print(
-                        f"[worker] Task {task.id} reached max retries "
-                        f"({MAX_RETRIES}) and is marked as permanently FAILED."
-                    )
+            # Entries are acknowledged together after the batch so the
+            # completion bookkeeping costs one round-trip, not one per
+            # task; retries are collected and re-appended after the
+            # status flush below.
+            processed: list[tuple[bytes, bytes]] = []
+            retry_tasks: list[Task] = []
+
+            for stream_key, entry_id, task in entries:
+                mark_task_in_progress(task.id)
+                success = execute_task(task)
+
+                if success:
+                    task.status = "COMPLETED"
+                    mark_task_completed(task.id)
+                    print(f"[worker] Task {task.id.hex()} finished with status={task.status}")
                 else:
-                    # The task still has retries left.
-                    # We apply exponential backoff before requeueing:
-                    #   delay = 2^retries seconds
-                    # This means the delay grows as the task fails repeatedly,
-                    # giving external systems time to recover.
-                    delay = 2**task.retries
-                    print(
-                        f"[worker] Task {task.id} will be retried "
-                        f"(attempt {task.retries}/{MAX_RETRIES}) after {delay}s."
-                    )
-                    time.sleep(delay)
-
-                    # Requeue the task so that it can be picked up again
-                    # by this or another worker.
-                    enqueue_task(task)
-                    task.status = "REQUEUED"
-                    print(f"[worker] Task {task.id} has been requeued for retry.")
+                    task.retries += 1
+
+                    if task.retries > MAX_RETRIES:
+                        task.status = "FAILED"
+                        mark_task_failed(task.id)
+                        print(
+                            f"[worker] Task {task.id.hex()} reached max retries "
+                            f"({MAX_RETRIES}) and is marked as permanently FAILED."
+                        )
+                    else:
+                        task.status = "REQUEUED"
+                        retry_tasks.append(task)
+
+                processed.append((stream_key, entry_id))
+
+            # Flush the buffered status updates first: re-appending a
+            # retry writes its REQUEUED status key, which a later flush
+            # of the buffered IN_PROGRESS marks would overwrite. Then
+            # re-append retries before acknowledging their original
+            # entries.
+            flush_status()
+            for task in retry_tasks:
+                stream_queue.enqueue_task(task)
+                print(f"[worker] Task {task.id.hex()} has been requeued for retry.")
+            stream_queue.ack_tasks(processed)
 
     except KeyboardInterrupt:
-        # Allow clean exit when running the worker from the command line.
         print("[worker] Received shutdown signal. Exiting worker loop.")
 
 
 if __name__ == "__main__":
-    worker_loop()
+    if QUEUE_BACKEND == "stream":
+        stream_worker_loop()
+    else:
+        worker_loop()
 
 